@@ -0,0 +1,13 @@
+import numpy as np
+
+
+def masks_to_12x8x8(masks: np.ndarray, out: np.ndarray) -> None:
+    """
+    Expands the packed bitboards of a batch of boards into their (12, 8, 8) one-hot representation, in a single np.unpackbits call for the whole batch.
+
+    Args:
+        masks (np.ndarray): An (N, 12) uint64 array holding one bitboard per channel of each board, with bit 8 * row + column set if that square of the channel is occupied.
+        out (np.ndarray): The (N, 12, 8, 8) int8 array to write the boards to. Every square is written, so it does not need to be zeroed first.
+    """
+    # Byte k of each little-endian mask is row k, and bit j of that byte is column j
+    out[:] = np.unpackbits(masks.astype("<u8").view(np.uint8), bitorder="little").reshape(out.shape)
@@ -1,10 +1,172 @@
+import asyncio
+import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import contextlib
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import zlib
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+except ImportError: # aiohttp is optional, fall back to sequential requests if it is not installed
+    aiohttp = None
+
+try:
+    import ijson
+except ImportError: # ijson is optional, fall back to loading each monthly archive in one go if it is not installed
+    ijson = None
 
 import pandas as pd
 import numpy as np
 
 import chess.pgn
 import io
+from collections.abc import AsyncIterator, Iterator
+
+from data_collection._kernels import masks_to_12x8x8
+
+HEADERS = {"User-Agent": "MyChessDataFetcher/1.0"}
+MAX_CONCURRENT_REQUESTS = 16 # Maximum number of monthly archives fetched at the same time
+MAX_RETRIES = 5 # Maximum number of times a request is retried after being rate limited or hitting a server error
+RETRY_BACKOFF = 0.3 # Base delay in seconds between retries, doubled after each attempt
+RETRY_STATUSES = (429, 500, 502, 503, 504) # Status codes worth retrying, 429 being Chess.com's rate limiting
+CHUNK_SIZE = 64 * 1024 # Size of the chunks monthly archives are streamed in
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "chess_predictor") # Where past monthly archives are stored, since they never change
+JSON_ERRORS = (ValueError,) if ijson is None else (ValueError, ijson.JSONError) # Errors raised when parsing invalid JSON
+
+# (piece type, color, signed value) for every piece. The value is the python-chess piece type (pawn 1, knight 2, bishop 3, rook 4, queen 5, king 6), positive for white pieces and negative for black pieces.
+PIECE_SIGN_VALUE = [
+    (piece_type, color, piece_type if color == chess.WHITE else -piece_type)
+    for color in chess.COLORS
+    for piece_type in chess.PIECE_TYPES
+]
+
+ESTIMATED_USER_MOVES_PER_GAME = 40 # Used to preallocate the training data arrays, which grow if games turn out to be longer
+
+# A single SAN move, e.g. e4, Nbxd7, exd8=Q+ or O-O-O#
+SAN_RE = re.compile(r"[KQRBN]?[a-h]?[1-8]?x?[a-h][1-8](?:=[QRBN])?[+#]?|O-O(?:-O)?[+#]?")
+# Parts of a PGN that are not moves: header lines, {comments} and ; comments, (variations), $NAGs and move numbers
+PGN_HEADER_RE = re.compile(r"^\[.*\]\s*$", re.MULTILINE)
+PGN_COMMENT_RE = re.compile(r"\{[^}]*\}|;[^\n]*")
+PGN_VARIATION_RE = re.compile(r"\([^()]*\)") # Innermost variations only, so it is applied until none are left
+PGN_NAG_RE = re.compile(r"\$\d+")
+PGN_MOVE_NUMBER_RE = re.compile(r"\d+\.(?:\.\.)?")
+PGN_RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+CHANNEL_VALUES = np.array([1, 2, 3, 4, 5, 6, -1, -2, -3, -4, -5, -6], dtype=np.int8) # Signed piece value stored in each of the 12 channels
+
+
+def _mask_to_bits(mask: int) -> np.ndarray:
+    """
+    Unpacks a 64-bit python-chess bitboard into an 8x8 boolean array.
+
+    Args:
+        mask (int): The bitboard, with bit n set if square n (a1 = 0, h8 = 63) is occupied.
+
+    Returns:
+        np.ndarray: An 8x8 boolean array where row 0 is the 1st rank and column 0 is the a-file.
+    """
+    # Byte k of the little-endian mask is rank k, and bit j of that byte is file j
+    bits = np.unpackbits(np.frombuffer(mask.to_bytes(8, "little"), dtype=np.uint8), bitorder="little")
+    return bits.reshape(8, 8).astype(bool)
+
+def _grow(array: np.ndarray, count: int, length: int) -> np.ndarray:
+    """
+    Resizes a preallocated array along its first axis, keeping the samples already written to it.
+
+    Args:
+        array (np.ndarray): The array to resize.
+        count (int): The number of samples written to the start of the array.
+        length (int): The new length of the first axis.
+
+    Returns:
+        np.ndarray: An array of the given length starting with the first count samples of array, or array itself if the length is unchanged.
+    """
+    if length == len(array):
+        return array
+    resized = np.empty((length, *array.shape[1:]), dtype=array.dtype)
+    resized[:count] = array[:count]
+    return resized
+
+
+def unpack_states(packed: np.ndarray) -> np.ndarray:
+    """
+    Expands boards packed as bitboards by DataCollector.get_data into their (12, 8, 8) representation (see DataCollector.board_to_12x8x8), e.g. one batch at a time when training.
+
+    Args:
+        packed (np.ndarray): An (N, 12) uint64 array of packed boards.
+
+    Returns:
+        np.ndarray: An (N, 12, 8, 8) int8 array with binary indicators.
+    """
+    states = np.empty((len(packed), 12, 8, 8), dtype=np.int8)
+    masks_to_12x8x8(packed, states)
+    return states
+
+
+def _tokenize_san(pgn: str) -> list[str] | None:
+    """
+    Extracts the SAN moves of a PGN's main line straight from its movetext, without replaying the game.
+
+    Args:
+        pgn (str): The PGN of the game.
+
+    Returns:
+        None if part of the movetext is not recognized as a SAN move.
+        list[str]: The SAN moves, exactly as written in the PGN.
+    """
+    movetext = PGN_HEADER_RE.sub(" ", pgn)
+    movetext = PGN_COMMENT_RE.sub(" ", movetext)
+    while True:
+        movetext, number_of_variations = PGN_VARIATION_RE.subn(" ", movetext)
+        if number_of_variations == 0:
+            break
+    movetext = PGN_NAG_RE.sub(" ", movetext)
+    movetext = PGN_MOVE_NUMBER_RE.sub(" ", movetext)
+    
+    tokens = movetext.split()
+    if tokens and tokens[-1] in PGN_RESULTS:
+        tokens.pop()
+    if not all(SAN_RE.fullmatch(token) for token in tokens):
+        return None
+    return tokens
+
+
+# Collector used by the worker processes of DataCollector.get_data, created once per process by _init_worker
+_worker_collector = None
+
+
+def _init_worker(username: str) -> None:
+    """
+    Creates the DataCollector used by a get_data worker process.
+
+    Args:
+        username (str): The Chess.com username of the player.
+    """
+    global _worker_collector
+    _worker_collector = DataCollector(username)
+
+
+def _pgn_to_data(pgn: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Converts a PGN to training samples in a get_data worker process. Defined at module level so that it can be sent to the worker processes.
+
+    Args:
+        pgn (str): The PGN to be converted.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The boards and labels of the game (see DataCollector.pgn_to_data).
+    """
+    return _worker_collector.pgn_to_data(pgn)
+
 
 class DataCollector():
     """
@@ -20,6 +182,16 @@ class DataCollector():
         get_user_color: Determines the color (white or black) of the user in a game.
         get_san_and_color: Returns a list of tuples containing the SAN moves and user color for each game.
         get_all_game_states: Returns a list of game states at each move for all games played by the user.
+        pgn_to_boards: Converts a PGN to the boards on each of the user's turns.
+        get_boards: Returns the boards on each of the user's turns for all games played by the user.
+        get_matrix_game_states: Returns the boards on each of the user's turns as 8x8 matrices of signed piece values for all games played by the user.
+        board_to_matrix: Converts a board to an 8x8 matrix of signed piece values, optionally mirrored to the user's side.
+        board_to_12x8x8: Converts a board directly to the (12, 8, 8) representation, optionally mirrored to the user's side.
+        board_to_8x8x12: Converts an 8x8 matrix of signed piece values to the (12, 8, 8) representation.
+        pgn_to_data: Converts a PGN to training samples, as (N, 12) uint64 packed boards and the (N,) squares the user moved a piece from.
+        get_data: Returns the training samples of all games played by the user as packed (N, 12) uint64 boards and (N,) int16 labels, optionally deduplicated (deduplicate) and streamed to files (path).
+
+    The packed boards returned by pgn_to_data and get_data are expanded to (N, 12, 8, 8) with the module-level unpack_states.
     """
 
     def __init__(self, username: str):
@@ -30,43 +202,365 @@ class DataCollector():
             username (str): The Chess.com username of the player.
         """
         self.username = username
+        self._games_df = None # Games DataFrame, fetched once and reused by every method that needs it
+        self._cache_writable = True # Set to False once writing to the cache fails, so that the remaining months are parsed straight from the responses
+
+        # Session reused for every request, so that connections are kept alive instead of being opened for each monthly archive
+        self._session = requests.Session()
+        self._session.headers.update(HEADERS)
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            respect_retry_after_header=True, # Wait as long as Chess.com asks to when rate limited
+            raise_on_status=False, # Hand the last response back instead of raising once retries run out
+        )
+        adapter = HTTPAdapter(pool_connections=MAX_CONCURRENT_REQUESTS, pool_maxsize=MAX_CONCURRENT_REQUESTS, max_retries=retry)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
     
     def fetch_games(self) -> pd.DataFrame:
         """
-        Fetches the games played by the user and returns them as a pandas DataFrame.
+        Fetches the games played by the user and returns them as a pandas DataFrame. The games are only fetched on the first call, later calls return the same DataFrame.
 
         Returns:
             pd.DataFrame: A DataFrame containing the games played by the user.
         """
-        headers = {"User-Agent": "MyChessDataFetcher/1.0"}
+        if self._games_df is not None:
+            return self._games_df
+
         archives_url = f"https://api.chess.com/pub/player/{self.username}/games/archives"
 
         # Get the list of archive URLs
-        archives_response = requests.get(archives_url, headers=headers)
+        archives_response = self._session.get(archives_url)
         if archives_response.status_code != 200:
-            print(f"Failed to fetch archives: {archives_response.status_code}")
-            exit()
+            raise RuntimeError(f"Failed to fetch archives: {archives_response.status_code}")
 
         months = archives_response.json().get("archives", [])
         
         months.reverse() # Reverse the list so that the most recent months are first
 
+        if aiohttp is not None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError: # No event loop running, so run one here
+                all_games = asyncio.run(self._fetch_all(months))
+            else:
+                # An event loop is already running (e.g. in Jupyter), and asyncio.run can't be nested in it, so run a separate loop on a worker thread
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    all_games = executor.submit(asyncio.run, self._fetch_all(months)).result()
+        else:
+            all_games = self._fetch_all_sequential(months)
+
+        # Return the games as a pandas DataFrame
+        self._games_df = pd.DataFrame(all_games)
+        return self._games_df
+
+    def _fetch_all_sequential(self, months: list[str]) -> list[dict]:
+        """
+        Fetches the games from each monthly archive one after the other, reusing connections through the requests session. Used when aiohttp is not installed.
+
+        Args:
+            months (list[str]): The monthly archive URLs, most recent first.
+
+        Returns:
+            list[dict]: The games from the most recent months, stopping once more than 10,000 games are collected.
+        """
         all_games = []  # Initialize an empty list to collect all games
     
         # Fetch games from each archive
         for month_url in months:
-            month_response = requests.get(month_url, headers=headers)
-            if month_response.status_code != 200:
-                print(f"Failed to fetch month {month_url}: {month_response.status_code}")
-                continue  # Skip this month and continue with the next
-            month_data = month_response.json()
-            games = month_data.get("games", [])
+            games = self._read_cached_month(month_url)
+            if games is None:
+                games = self._fetch_month_sequential(month_url)
             all_games.extend(games)  # Add games to the list
             if len(all_games) > 10_000:
                 break # Stop after collecting 10,000 games
+        return all_games
 
-        # Return the games as a pandas DataFrame
-        return pd.DataFrame(all_games)
+    def _fetch_month_sequential(self, month_url: str) -> list[dict]:
+        """
+        Fetches the games of a single monthly archive through the requests session, streaming past months into the cache.
+
+        Args:
+            month_url (str): The monthly archive URL.
+
+        Returns:
+            list[dict]: The games of the month, or an empty list if the month could not be fetched.
+        """
+        with self._session.get(month_url, stream=True) as month_response:
+            if month_response.status_code != 200:
+                print(f"Failed to fetch month {month_url}: {month_response.status_code}")
+                return []  # Skip this month and continue with the next
+            with self._cache_writer(month_url) as cache_file:
+                if cache_file is None: # Current month or cache not writable, so parse the games straight from the response
+                    month_response.raw.decode_content = True # Undo any gzip content encoding while streaming
+                    return self._load_games(month_response.raw)
+                # Stream the archive into the cache, then parse the games from there
+                for chunk in month_response.iter_content(CHUNK_SIZE):
+                    try:
+                        cache_file.write(chunk)
+                    except OSError as error:
+                        self._disable_cache(error)
+                        break
+        games = self._read_cached_month(month_url)
+        if games is None and not self._cache_writable:
+            return self._fetch_month_sequential(month_url) # The response was used up writing to the cache, so fetch it again now that caching is off
+        return games or []
+
+    async def _fetch_all(self, months: list[str]) -> list[dict]:
+        """
+        Fetches the games from all monthly archives concurrently, reusing connections through a single session.
+
+        Args:
+            months (list[str]): The monthly archive URLs, most recent first.
+
+        Returns:
+            list[dict]: The games from the most recent months, stopping once more than 10,000 games are collected.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        async def fetch_month(session: aiohttp.ClientSession, month_url: str) -> list[dict]:
+            async with semaphore:
+                for attempt in range(MAX_RETRIES + 1):
+                    async with session.get(month_url) as month_response:
+                        if month_response.status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                            delay = self._retry_delay(attempt, month_response.headers.get("Retry-After"))
+                        elif month_response.status != 200:
+                            print(f"Failed to fetch month {month_url}: {month_response.status}")
+                            return [] # Skip this month
+                        else:
+                            async with self._cache_writer_async(month_url) as cache_file:
+                                if cache_file is None: # Current month or cache not writable, so parse the games straight from the response
+                                    return await self._load_games_async(month_response.content)
+                                # Stream the archive into the cache, then parse the games from there
+                                async for chunk in month_response.content.iter_chunked(CHUNK_SIZE):
+                                    try:
+                                        await asyncio.to_thread(cache_file.write, chunk) # Compress and write on a worker thread, so that the other months keep downloading
+                                    except OSError as error:
+                                        self._disable_cache(error)
+                                        break
+                            break
+                    await asyncio.sleep(delay) # Keep holding the semaphore while waiting, so that fewer requests are made while rate limited
+            games = self._read_cached_month(month_url)
+            if games is None and not self._cache_writable:
+                return await fetch_month(session, month_url) # The response was used up writing to the cache, so fetch it again now that caching is off
+            return games or []
+
+        connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_REQUESTS)
+        async with aiohttp.ClientSession(headers=HEADERS, connector=connector) as session:
+            scanned = 0 # The months before this index have been read from the cache or started fetching
+            known_games = 0 # Number of games in the months read from the cache or fetched so far
+            known_months = 0 # Number of months read from the cache or fetched so far
+            cached_games = {} # Games of the months read from the cache ahead of their turn, by index
+            fetching = collections.deque() # Indices of the months being fetched ahead of the current one
+            tasks = {}
+
+            all_games = []
+            try:
+                # Go through the months from most recent, waiting for each fetch only when its turn comes
+                for index, month_url in enumerate(months):
+                    while fetching and fetching[0] < index:
+                        fetching.popleft()
+                    # Read the next months from the cache and start fetching the ones that are not cached, stopping once enough games are expected to reach the cutoff so that few requests are wasted on older months
+                    while scanned < len(months) and len(fetching) < MAX_CONCURRENT_REQUESTS:
+                        expected_games = known_games + len(fetching) * known_games / max(known_months, 1) # Months still being fetched are assumed to hold as many games as the average known month
+                        if expected_games > 10_000:
+                            break
+                        games = self._read_cached_month(months[scanned])
+                        if games is not None:
+                            cached_games[scanned] = games
+                            known_games += len(games)
+                            known_months += 1
+                        else:
+                            tasks[scanned] = asyncio.create_task(fetch_month(session, months[scanned]))
+                            fetching.append(scanned)
+                        scanned += 1
+
+                    games = cached_games.pop(index, None)
+                    if games is None:
+                        games = await tasks[index]
+                        known_games += len(games)
+                        known_months += 1
+                    all_games.extend(games)
+                    if len(all_games) > 10_000:
+                        break # Stop after collecting 10,000 games
+            finally:
+                for task in tasks.values():
+                    task.cancel() # Cancel the requests for older months that are no longer needed
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return all_games
+
+    def _retry_delay(self, attempt: int, retry_after: str | None) -> float:
+        """
+        Determines how long to wait before retrying a request that was rate limited or hit a server error.
+
+        Args:
+            attempt (int): The number of attempts already retried (0 for the first retry).
+            retry_after (str | None): The Retry-After header of the response, if any.
+
+        Returns:
+            float: The number of seconds to wait, which is the Retry-After value when it is given in seconds, otherwise an exponential backoff.
+        """
+        if retry_after is not None:
+            try:
+                return max(float(retry_after), 0.0)
+            except ValueError:
+                pass # Retry-After can also be an HTTP date, in which case use the backoff instead
+        return RETRY_BACKOFF * 2 ** attempt
+
+    def _is_past_month(self, month_url: str) -> bool:
+        """
+        Determines whether a monthly archive URL is for a month that is already over, meaning its games can no longer change.
+
+        Args:
+            month_url (str): The monthly archive URL, ending in YYYY/MM.
+
+        Returns:
+            bool: True if the archive is for a month before the current one, False otherwise.
+        """
+        try:
+            year, month = (int(part) for part in month_url.rstrip("/").split("/")[-2:])
+        except ValueError:
+            return False # Unexpected URL format, so never cache it
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return (year, month) < (now.year, now.month)
+
+    def _cache_path(self, month_url: str) -> str:
+        """
+        Returns the path of the cache file for a monthly archive URL.
+
+        Args:
+            month_url (str): The monthly archive URL.
+
+        Returns:
+            str: The path of the gzipped JSON cache file.
+        """
+        url_hash = hashlib.sha256(month_url.encode()).hexdigest()
+        return os.path.join(CACHE_DIR, f"{url_hash}.json.gz")
+
+    def _read_cached_month(self, month_url: str) -> list[dict] | None:
+        """
+        Reads the games of a past monthly archive from the on-disk cache.
+
+        Args:
+            month_url (str): The monthly archive URL.
+
+        Returns:
+            None if the month is the current one or is not cached yet.
+            list[dict]: The games of the month.
+        """
+        if not self._is_past_month(month_url):
+            return None
+        try:
+            with gzip.open(self._cache_path(month_url), "rb") as cache_file:
+                return self._load_games(cache_file)
+        except (OSError, EOFError, zlib.error, *JSON_ERRORS): # Missing, truncated or corrupted cache file, so fetch the month again
+            return None
+
+    @contextlib.contextmanager
+    def _cache_writer(self, month_url: str) -> Iterator[gzip.GzipFile | None]:
+        """
+        Opens the on-disk cache file of a past monthly archive for writing the raw JSON response into. The current month is never cached since new games can still be added to it.
+
+        Args:
+            month_url (str): The monthly archive URL.
+
+        Yields:
+            None if the month is the current one or the cache can't be written to (e.g. read-only or full disk), in which case the response should be parsed directly.
+            gzip.GzipFile: The file to write the raw JSON response to. It only replaces the cache file once the block exits without an error and every write succeeded, so an interrupted download never leaves a truncated cache file.
+        """
+        if not self._is_past_month(month_url) or not self._cache_writable:
+            yield None
+            return
+
+        cache_path = self._cache_path(month_url)
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            raw_file = open(temporary_path, "wb")
+        except OSError as error:
+            self._disable_cache(error)
+            yield None
+            return
+        cache_file = gzip.GzipFile(fileobj=raw_file, mode="wb")
+
+        completed = False
+        try:
+            yield cache_file
+            completed = True
+        finally:
+            try:
+                with raw_file:
+                    cache_file.close() # Ends the gzip stream, but leaves raw_file open
+                    raw_file.flush()
+                    os.fsync(raw_file.fileno()) # Make sure the data is on disk before the rename, so that a crash can't leave a truncated cache file behind
+                if completed and self._cache_writable:
+                    os.replace(temporary_path, cache_path)
+            except OSError as error:
+                self._disable_cache(error)
+            with contextlib.suppress(OSError):
+                os.remove(temporary_path) # Only left behind if the cache file was not replaced
+
+    @contextlib.asynccontextmanager
+    async def _cache_writer_async(self, month_url: str) -> AsyncIterator[gzip.GzipFile | None]:
+        """
+        Same as _cache_writer, but opens and finishes the cache file (including the fsync) on a worker thread so that the event loop is not blocked while other months download.
+
+        Args:
+            month_url (str): The monthly archive URL.
+
+        Yields:
+            None if the response should be parsed directly, otherwise the file to write the raw JSON response to (see _cache_writer).
+        """
+        writer = self._cache_writer(month_url)
+        cache_file = await asyncio.to_thread(writer.__enter__)
+        try:
+            yield cache_file
+        except BaseException as error:
+            if not await asyncio.to_thread(writer.__exit__, type(error), error, error.__traceback__):
+                raise
+        else:
+            await asyncio.to_thread(writer.__exit__, None, None, None)
+
+    def _disable_cache(self, error: OSError):
+        """
+        Stops writing monthly archives to the on-disk cache after a write failed, so that fetching games keeps working without it.
+
+        Args:
+            error (OSError): The error raised while writing to the cache.
+        """
+        if self._cache_writable:
+            print(f"Failed to write to the cache in {CACHE_DIR}, continuing without caching: {error}")
+        self._cache_writable = False
+
+    def _load_games(self, json_file) -> list[dict]:
+        """
+        Reads the games of a monthly archive from a file-like object holding its JSON. With ijson, each game is parsed as it is read instead of loading the whole archive first.
+
+        Args:
+            json_file: A binary file-like object holding the JSON of the monthly archive.
+
+        Returns:
+            list[dict]: The games of the month.
+        """
+        if ijson is None:
+            return json.load(json_file).get("games", [])
+        return list(ijson.items(json_file, "games.item", use_float=True))
+
+    async def _load_games_async(self, stream: "aiohttp.StreamReader") -> list[dict]:
+        """
+        Reads the games of a monthly archive from an aiohttp response stream, parsing each game as it arrives when ijson is installed.
+
+        Args:
+            stream (aiohttp.StreamReader): The content of the monthly archive response.
+
+        Returns:
+            list[dict]: The games of the month.
+        """
+        if ijson is None:
+            return json.loads(await stream.read()).get("games", [])
+        return [game async for game in ijson.items_async(stream, "games.item", use_float=True)]
 
     def get_all_pgns(self) -> pd.DataFrame:
         """
@@ -78,6 +572,69 @@ class DataCollector():
         games = self.fetch_games()
         return games['pgn']
     
+    def pgn_to_san(self, pgn: str) -> list[str]:
+        """
+        Converts a PGN to a list of moves in Standard Algebraic Notation (SAN). The moves are read straight from the PGN text, only replaying the game with python-chess if the text contains something unexpected.
+
+        Args:
+            pgn (str): The PGN to be converted.
+
+        Returns:
+            list[str]: The SAN moves of the game's main line, e.g. ['e4', 'e5', 'Nf3'].
+        """
+        san = _tokenize_san(pgn)
+        if san is not None:
+            return san
+        
+        # Fall back to replaying the game to generate the SAN of each move
+        game = self._parse_pgn(pgn)
+        board = game.board()
+        san = []
+        for move in game.mainline_moves():
+            san.append(board.san(move))
+            board.push(move)
+        return san
+
+    def _parse_pgn(self, pgn: str) -> chess.pgn.Game:
+        """
+        Parses a PGN into a python-chess Game object.
+
+        Args:
+            pgn (str): The PGN of the game.
+
+        Returns:
+            chess.pgn.Game: The parsed game.
+        """
+        pgn_io = io.StringIO(pgn)
+        return chess.pgn.read_game(pgn_io)
+
+    def _user_color_from_game(self, game: chess.pgn.Game) -> str:
+        """
+        Determines the color (white or black) of the user in an already parsed game.
+
+        Args:
+            game (chess.pgn.Game): The parsed game.
+
+        Returns:
+            str: The color of the user in the game ('white' or 'black').
+        """
+        return self._user_color_from_headers(game.headers)
+
+    def _user_color_from_headers(self, headers: chess.pgn.Headers) -> str:
+        """
+        Determines the color (white or black) of the user from the headers of a game.
+
+        Args:
+            headers (chess.pgn.Headers): The headers of the game.
+
+        Returns:
+            str: The color of the user in the game ('white' or 'black').
+        """
+        if headers["White"] == self.username:
+            return "white"
+        else:
+            return "black"
+
     def get_user_color(self, pgn: str) -> str:
         """
         Determines the color (white or black) of the user in a game.
@@ -89,92 +646,108 @@ class DataCollector():
             str: The color of the user in the game ('white' or 'black').
         """
         # Parse the PGN using python-chess
-        pgn_io = io.StringIO(pgn)
-        game = chess.pgn.read_game(pgn_io)
+        game = self._parse_pgn(pgn)
 
         # Get the color of the user
-        if game.headers["White"] == self.username:
-            return "white"
-        else:
-            return "black"
+        return self._user_color_from_game(game)
+
+    def get_san_and_color(self) -> list[tuple[list[str], str]]:
+        """
+        Returns a list of tuples containing the SAN moves and user color for each game.
 
-    def pgn_to_boards(self, pgn: str) -> list[chess.Board]:
+        Returns:
+            list[tuple[list[str], str]]: One tuple per game, containing the SAN moves (see pgn_to_san) and the color of the user in the game ('white' or 'black').
+        """
+        san_and_color = []
+        all_pgns = self.get_all_pgns()
+        for pgn in all_pgns:
+            if type(pgn) != str: # Sometimes, the Chess.com API gives a None value or float value for a game, so we need to skip it
+                continue
+            headers = chess.pgn.read_headers(io.StringIO(pgn)) # Only the headers are needed for the color, so skip parsing the moves
+            san_and_color.append((self.pgn_to_san(pgn), self._user_color_from_headers(headers)))
+        return san_and_color
+
+    def get_all_game_states(self) -> list[tuple[tuple[str, ...], int]]:
+        """
+        Returns a list of game states at each move for all games played by the user, with one game state per user turn.
+
+        Rather than copying the moves played so far for every state, each state refers to the SAN moves of its whole game (shared by all states of that game) and the number of moves played before the user's turn, so that the moves leading to the state are san[:cut].
+
+        Returns:
+            list[tuple[tuple[str, ...], int]]: A list of (san, cut) tuples, where san is the tuple of SAN moves of the game (see pgn_to_san) and cut the number of moves played before the user's move.
+        """
+        all_game_states = []
+        for san, user_color in self.get_san_and_color():
+            san = tuple(san) # Shared by every state of the game
+            if user_color == 'white':
+                first_user_move = 0
+            else:
+                first_user_move = 1
+            for cut in range(first_user_move, len(san), 2):
+                all_game_states.append((san, cut))
+        return all_game_states
+
+    def pgn_to_boards(self, pgn: str | chess.pgn.Game) -> list[chess.Board]:
         """
         Converts a PGN to a list of chess.Board objects for each game state in the PGN (only on user turns). 
 
         Args:
-            pgn (str): The PGN to be converted.
+            pgn (str | chess.pgn.Game): The PGN to be converted, or the game already parsed from it.
 
         Returns:
-            list[chess.Board]: A list of chess.Board objects extracted from the PGN. The chess.Board objects only contain game states for which it is the user's turn.
+            list[chess.Board]: A list of chess.Board objects extracted from the PGN. The chess.Board objects only contain game states for which it is the user's turn. Boards are not mirrored when the user is black, pass mirror=True to board_to_matrix or board_to_12x8x8 instead.
         """
-        # Parse the PGN using python-chess
-        pgn_io = io.StringIO(pgn)
-        game = chess.pgn.read_game(pgn_io)
+        # Parse the PGN using python-chess, unless it was already parsed
+        if isinstance(pgn, chess.pgn.Game):
+            game = pgn
+        else:
+            game = self._parse_pgn(pgn)
 
         # Initialize an empty list to hold boards
         boards = []
 
         # Iterate through the moves of the main line
+        for board, move in self._user_turns(game):
+            boards.append(board.copy()) # Boards are mirrored for black users when they are converted, which avoids building a second board here
+            
+        return boards
+
+    def _user_turns(self, game: chess.pgn.Game) -> Iterator[tuple[chess.Board, chess.Move]]:
+        """
+        Iterates through the main line of a game, yielding the board and the move played on each of the user's turns.
+
+        Args:
+            game (chess.pgn.Game): The parsed game.
+
+        Yields:
+            tuple[chess.Board, chess.Move]: The board before the user's move and the move the user played. The same board object is updated in place as the game goes on, so it must be copied to be kept.
+        """
         board = game.board()
-        user_color = self.get_user_color(pgn)
-        if user_color == 'white':
+        if self._user_color_from_game(game) == 'white':
             user_starting_move = 0
         else:
             user_starting_move = 1
         for move_number, move in enumerate(game.mainline_moves()):
-            if move_number % 2 == user_starting_move: # Only add the board if it is the user's turn to move. Works by checking if move number is even if user is white, odd if user is black.
-                if user_color == 'white':
-                    boards.append(board.copy())
-                else:
-                    boards.append(board.mirror().copy()) # Mirror the board if user is black, so that resulting matrices are consistent whether white or black.
+            if move_number % 2 == user_starting_move: # Only yield the board if it is the user's turn to move. Works by checking if move number is even if user is white, odd if user is black.
+                yield board, move
             board.push(move)
-            
-        return boards
     
     def get_boards(self) -> list[list[chess.Board]]:
         """
         Retrieves a list of chess boards from all available PGN files, with one board per game state where it is the user's turn.
 
         Returns:
-            A list of lists, where each inner list represents the chess boards extracted from a single PGN file (single game).
+            A list of lists, where each inner list represents the chess boards extracted from a single PGN file (single game). Boards are not mirrored when the user is black (see pgn_to_boards).
         """
         all_boards = []
         all_pgns = self.get_all_pgns()
         for pgn in all_pgns:
             if type(pgn) != str: # Sometimes, the Chess.com API gives a None value or float value for a game, so we need to skip it
                 continue
-            all_boards.append(self.pgn_to_boards(pgn))
+            game = self._parse_pgn(pgn)
+            all_boards.append(self.pgn_to_boards(game))
         return all_boards
             
-    def piece_to_int(self, piece: chess.Piece) -> int:
-        """
-        Converts a chess piece object to an integer representation.
-
-        Args:
-            piece (chess.Piece): The chess piece object to be converted.
-
-        Returns:
-            int: The integer representation of the chess piece.
-            No piece: 0
-            Pawn: 1
-            Knight: 2
-            Bishop: 3
-            Rook: 4
-            Queen: 5
-            King: 6
-        """
-        piece_to_int = {
-            None: 0,
-            chess.PAWN: 1,
-            chess.KNIGHT: 2,
-            chess.BISHOP: 3,
-            chess.ROOK: 4,
-            chess.QUEEN: 5,
-            chess.KING: 6
-        }
-        return piece_to_int[piece.piece_type]
-    
     def get_matrix_game_states(self) -> list[list[np.ndarray]]:
         """
         Converts the board game states into matrices representing the positions of the chess pieces.
@@ -182,61 +755,78 @@ class DataCollector():
         Returns:
             A list of lists of numpy arrays, where each numpy array in the inner list represents a game state as a matrix, and each outer list is one game.
         """
-        all_board_game_states = self.get_boards()
-        
         all_matrices = []
-        i = 0
-        for game in all_board_game_states:
-            game_matrices = []
-            for board in game:
-                matrix = np.zeros((8, 8), dtype=int)
-                for square in range(64):
-                    piece = board.piece_at(square)
-                    if piece is None:
-                        continue
-                    row, col = square // 8, square % 8
-                    value = self.piece_to_int(piece)
-                    if piece.color == chess.BLACK: # Although this seems like it switches black pieces to negative, it is actually switching the perspective of the board so that the user's pieces are always positive.
-                        value *= -1
-                    matrix[7 - row][col] = value
-
-                game_matrices.append(matrix)
+        all_pgns = self.get_all_pgns()
+        for pgn in all_pgns:
+            if type(pgn) != str: # Sometimes, the Chess.com API gives a None value or float value for a game, so we need to skip it
+                continue
+            game = self._parse_pgn(pgn)
+            mirror = self._user_color_from_game(game) == 'black' # Mirror the board if user is black, so that resulting matrices are consistent whether white or black.
+            game_matrices = [self.board_to_matrix(board, mirror=mirror) for board in self.pgn_to_boards(game)]
             all_matrices.append(game_matrices)
         return all_matrices
-    
-    def find_moved_piece(self, board_state_1: np.ndarray, board_state_2: np.ndarray) -> tuple[int, int] | None:
+
+    def board_to_matrix(self, board: chess.Board, mirror: bool = False) -> np.ndarray:
         """
-        Finds the moved piece between two board states.
+        Converts a board into an 8x8 matrix of signed piece values (see PIECE_SIGN_VALUE, 0 for empty squares), built from the board's bitboards instead of looking up each square.
 
         Args:
-            board_state_1 (np.ndarray): The initial board state.
-            board_state_2 (np.ndarray): The next board state.
+            board (chess.Board): The board to be converted.
+            mirror (bool): If True, the matrix is built as if from board.mirror() (flipped vertically with colors swapped), without creating the mirrored board.
 
         Returns:
-            None if no piece was moved.
-            tuple[int, int]: A tuple containing the square number (0 to 63) and the value of the piece that was moved.
-            Pawn: 1
-            Knight: 2
-            Bishop: 3
-            Rook: 4
-            Queen: 5
-            King: 6
-        """
-        flattened_board_state_1 = board_state_1.flatten()
-        flattened_board_state_2 = board_state_2.flatten()
-        
-        exists_moved_piece = False
-        
-        for square_number, piece_in_square in enumerate(flattened_board_state_1):
-            if piece_in_square != flattened_board_state_2[square_number] and piece_in_square > 0: # If the piece in the square is different between the two board states and the piece is positive (user's piece)
-                moved_square_number = square_number
-                moved_piece = piece_in_square
-                exists_moved_piece = True
-        if exists_moved_piece:
-            return moved_square_number, moved_piece
-        return None
-    
+            np.ndarray: An 8x8 int8 matrix where row 0 is the 8th rank and column 0 is the a-file. The user's pieces are positive and the opponent's pieces negative.
+        """
+        matrix = np.zeros((8, 8), dtype=np.int8)
+        for piece_type, color, value in PIECE_SIGN_VALUE:
+            mask = board.pieces_mask(piece_type, color)
+            if not mask:
+                continue
+            bits = _mask_to_bits(mask)
+            if mirror:
+                value = -value # Mirroring swaps colors, and the flipped ranks are already in matrix row order
+            else:
+                bits = bits[::-1] # Flip so that row 0 is the 8th rank
+            matrix[bits] = value
+        return matrix
+
+    def board_to_12x8x8(self, board: chess.Board, mirror: bool = False, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        Converts a board directly into the (12, 8, 8) representation returned by board_to_8x8x12, without building the 8x8 matrix first.
+
+        Args:
+            board (chess.Board): The board to be converted.
+            mirror (bool): If True, the tensor is built as if from board.mirror() (flipped vertically with colors swapped), without creating the mirrored board.
+            out (np.ndarray | None): A (12, 8, 8) int8 array to write the tensor into, e.g. a slice of a larger preallocated array. A new array is created if None.
+
+        Returns:
+            np.ndarray: A (12, 8, 8) int8 array with binary indicators (out, if given). Channels 0 to 5 hold the user's pawns, knights, bishops, rooks, queens and king, channels 6 to 11 the opponent's.
+        """
+        if out is None:
+            tensor = np.empty((12, 8, 8), dtype=np.int8)
+        else:
+            tensor = out
+        masks = np.array([self._board_masks(board, mirror)], dtype=np.uint64)
+        masks_to_12x8x8(masks, tensor[np.newaxis])
+        return tensor
+
+    def _board_masks(self, board: chess.Board, mirror: bool = False) -> list[int]:
+        """
+        Returns the bitboards of a board in the channel and row order of board_to_12x8x8, which is the packed representation returned by get_data.
+
+        Args:
+            board (chess.Board): The board.
+            mirror (bool): If True, the bitboards are built as if from board.mirror() (flipped vertically with colors swapped).
 
+        Returns:
+            list[int]: The 12 bitboards, the user's pawns, knights, bishops, rooks, queens and king first, then the opponent's. Bit 8 * row + column is set if that square is occupied, where row 0 is the 8th rank from the user's side.
+        """
+        user_color = chess.BLACK if mirror else chess.WHITE
+        masks = [board.pieces_mask(piece_type, color) for color in (user_color, not user_color) for piece_type in chess.PIECE_TYPES]
+        if mirror:
+            return masks # Mirroring flips the ranks, so the 1st rank of the board is already row 0
+        return [chess.flip_vertical(mask) for mask in masks] # Flip so that the 8th rank is row 0
+    
     def board_to_8x8x12(self, game_state: np.ndarray) -> np.ndarray:
         """
         Convert an 8x8 board matrix to an 8x8x12 representation.
@@ -249,46 +839,99 @@ class DataCollector():
          -4 for black rook, -5 for black queen, -6 for black king.
      
         Returns:
-            A NumPy array of shape (8, 8, 12) with binary indicators.
+            A NumPy array of shape (12, 8, 8) with binary indicators.
         """
-        # Initialize the 8x8x12 array with zeros
-        board_12 = np.zeros((8, 8, 12), dtype=np.int8)
-    
-        # Loop over each square in the 8x8 board
-        for i in range(8):
-            for j in range(8):
-                piece = game_state[i, j]
-                if piece == 0:
-                    continue  # Skip empty squares
-                # For white pieces (positive values), channel = piece value - 1 (0-indexed)
-                if piece > 0:
-                    channel = int(piece) - 1
-                # For black pieces (negative values), channel = (abs(piece) - 1) + 6
-                else:
-                    channel = int(abs(piece)) - 1 + 6
-                board_12[i, j, channel] = 1
-
-        # Transpose from (8,8,12) to (12,8,8)
-        board_12 = np.transpose(board_12, (2, 0, 1))
+        # Compare the matrix against the value of every channel at once, which directly gives the (12,8,8) layout
+        board_12 = (game_state[np.newaxis, :, :] == CHANNEL_VALUES[:, np.newaxis, np.newaxis]).astype(np.int8)
         return board_12
 
     
-    def get_data(self) -> list[tuple[list[np.ndarray], int]]:
-        data = []
+    def pgn_to_data(self, pgn: str | chess.pgn.Game) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Converts a PGN to training samples, one per user turn, pairing the board with the square of the piece the user moved.
+
+        Args:
+            pgn (str | chess.pgn.Game): The PGN to be converted, or the game already parsed from it.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The boards packed as an (N, 12) uint64 array of bitboards (see unpack_states) and the squares (0 to 63) the user moved a piece from as an (N,) int16 array. Boards are mirrored if the user is black, and squares are numbered like the flattened 8x8 matrix (0 is a8, 63 is h1 from the user's side).
+        """
+        # Parse the PGN using python-chess, unless it was already parsed
+        if isinstance(pgn, chess.pgn.Game):
+            game = pgn
+        else:
+            game = self._parse_pgn(pgn)
+
+        mirror = self._user_color_from_game(game) == 'black' # Mirror the board if user is black, so that the user's pieces always start at the bottom
+        number_of_moves = sum(1 for _ in game.mainline_moves())
+        number_of_user_moves = (number_of_moves + 1 - int(mirror)) // 2 # The user plays the even moves if white, odd moves if black
         
-        matrix_game_states = self.get_matrix_game_states()
+        states = np.empty((number_of_user_moves, 12), dtype=np.uint64)
+        labels = np.empty(number_of_user_moves, dtype=np.int16)
+        for i, (board, move) in enumerate(self._user_turns(game)):
+            states[i] = self._board_masks(board, mirror=mirror)
+            # The matrix row of a square is its rank counted from the 8th, which mirroring the board undoes
+            labels[i] = move.from_square if mirror else chess.square_mirror(move.from_square)
+        return states, labels
+
+    def get_data(self, path: str | None = None, deduplicate: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Builds the training data from all of the user's games (see pgn_to_data). The games are parsed and converted in parallel, one worker process per CPU core, and the samples are gathered into a single contiguous array.
+
+        Args:
+            path (str | None): If given, a directory to stream the samples to instead of keeping them in memory. The boards are written to states.uint64 and the labels to labels.int16, which can be loaded back with np.memmap (or np.fromfile) and reshaped to (-1, 12) and (-1,).
+            deduplicate (bool): If True, samples with the same board and the same moved square as an earlier sample are skipped. Openings repeat across many games, so this drops a lot of identical early-game samples.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The boards of every game packed as an (N, 12) uint64 array of bitboards, 8 times smaller than the (N, 12, 8, 8) representation they expand to with unpack_states, and the squares (0 to 63) the user moved a piece from as an (N,) int16 array. Both are np.memmap arrays backed by the files in path, if given and there is at least one sample.
+        """
+        all_pgns = self.get_all_pgns()
+        pgns = [pgn for pgn in all_pgns if type(pgn) == str] # Sometimes, the Chess.com API gives a None value or float value for a game, so we need to skip it
+        
+        # Preallocate for a rough estimate of the number of samples, growing if it turns out to be too small
+        capacity = len(pgns) * ESTIMATED_USER_MOVES_PER_GAME if path is None else 0
+        states = np.empty((capacity, 12), dtype=np.uint64)
+        labels = np.empty((capacity,), dtype=np.int16)
+        count = 0
+        seen = set() # (board, moved square) of every sample kept so far, when deduplicating
+        
+        with contextlib.ExitStack() as stack:
+            if path is not None:
+                # The samples are appended to the files as they come in, and only memory-mapped once they are all written, so a mapped file is never resized (which fails on Windows)
+                os.makedirs(path, exist_ok=True)
+                states_filename = os.path.join(path, "states.uint64")
+                labels_filename = os.path.join(path, "labels.int16")
+                states_file = stack.enter_context(open(states_filename, "wb"))
+                labels_file = stack.enter_context(open(labels_filename, "wb"))
+            # Parsing PGNs holds the GIL, so use processes rather than threads
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_worker, initargs=(self.username,)))
+            for game_states, game_labels in executor.map(_pgn_to_data, pgns, chunksize=32):
+                if deduplicate:
+                    # The packed board identifies the position from the user's side, so it is used directly as the key
+                    is_new = np.zeros(len(game_labels), dtype=bool)
+                    for i in range(len(game_labels)):
+                        key = (game_states[i].tobytes(), int(game_labels[i]))
+                        if key not in seen:
+                            seen.add(key)
+                            is_new[i] = True
+                    game_states, game_labels = game_states[is_new], game_labels[is_new]
+                number_of_samples = len(game_labels)
+                if path is not None:
+                    states_file.write(game_states.tobytes())
+                    labels_file.write(game_labels.tobytes())
+                else:
+                    if count + number_of_samples > len(labels):
+                        capacity = max(2 * len(labels), count + number_of_samples)
+                        states = _grow(states, count, capacity)
+                        labels = _grow(labels, count, capacity)
+                    states[count:count + number_of_samples] = game_states
+                    labels[count:count + number_of_samples] = game_labels
+                count += number_of_samples
         
-        for individual_game_states in matrix_game_states: # individual_game_states are all matrix game states for a single game
-            for move_number, game_state in enumerate(individual_game_states): 
-                if move_number == len(individual_game_states) - 1:
-                    break # If move_number is the last available game_state of the game, break the loop and move to next game
-                board_state_1 = game_state
-                board_state_2 = individual_game_states[move_number + 1]
-                try:
-                    moved_square_number, moved_piece = self.find_moved_piece(board_state_1=board_state_1, board_state_2=board_state_2)
-                except TypeError:
-                    continue
-                game_state_12 = self.board_to_8x8x12(game_state)
-                
-                data.append((game_state_12, moved_square_number))
-        return data
+        if path is not None and count > 0: # Empty files can't be memory-mapped, so the empty arrays are returned instead
+            return (
+                np.memmap(states_filename, dtype=np.uint64, mode="r+", shape=(count, 12)),
+                np.memmap(labels_filename, dtype=np.int16, mode="r+", shape=(count,)),
+            )
+        # Trim the unused end of the arrays
+        return _grow(states, count, count), _grow(labels, count, count)